@@ -48,16 +48,20 @@ function generate_chroma_config() {
 
 import chromadb
 from chromadb.config import Settings
+from functools import lru_cache
 import os
 
 # Configuration
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", "./chroma")
 CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
 CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+CHROMA_MAX_BATCH_SIZE = int(os.getenv("CHROMA_MAX_BATCH_SIZE", "1000"))
 
 # Chroma client configuration
+# Cached so every service and processor in the process shares one client
+@lru_cache(maxsize=1)
 def get_chroma_client():
-    """Get Chroma client instance"""
+    """Get shared Chroma client instance"""
     return chromadb.PersistentClient(
         path=CHROMA_DB_PATH,
         settings=Settings(
@@ -67,8 +71,10 @@ def get_chroma_client():
     )
 
 # HTTP client for remote Chroma server (optional)
+# Cached so every caller shares one client and its keep-alive connection pool
+@lru_cache(maxsize=1)
 def get_chroma_http_client():
-    """Get Chroma HTTP client for remote server"""
+    """Get shared Chroma HTTP client for remote server"""
     return chromadb.HttpClient(
         host=CHROMA_HOST,
         port=CHROMA_PORT,
@@ -81,6 +87,15 @@ def get_chroma_http_client():
 DEFAULT_COLLECTION_NAME = "${PROJECT_NAME:-app}_documents"
 DEFAULT_EMBEDDING_FUNCTION = "default"  # Uses sentence-transformers
 
+# HNSW index settings, applied when a collection is first created
+# (Chroma ignores them for collections that already exist)
+HNSW_METADATA = {
+    "hnsw:space": os.getenv("CHROMA_HNSW_SPACE", "cosine"),
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "16")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "100")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_SEARCH_EF", "100")),
+}
+
 # Metadata configuration
 METADATA_SCHEMA = {
     "source": str,
@@ -155,7 +170,6 @@ function generate_chroma_scripts() {
 """Reset Chroma database"""
 
 import sys
-import os
 sys.path.append('..')
 
 from chroma_config import get_chroma_client
@@ -181,11 +195,10 @@ EOF
 """Manage Chroma collections"""
 
 import sys
-import os
 import argparse
 sys.path.append('..')
 
-from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME
+from chroma_config import get_chroma_client, HNSW_METADATA
 
 def list_collections():
     """List all collections"""
@@ -205,7 +218,7 @@ def create_collection(name: str):
     """Create a new collection"""
     client = get_chroma_client()
     try:
-        collection = client.create_collection(name=name)
+        client.create_collection(name=name, metadata=HNSW_METADATA)
         print(f"✅ Created collection: {name}")
     except Exception as e:
         print(f"❌ Error creating collection: {e}")
@@ -239,30 +252,29 @@ def collection_info(name: str):
     except Exception as e:
         print(f"❌ Error getting collection info: {e}")
 
+# Actions that operate on a single named collection
+NAMED_ACTIONS = {
+    "create": create_collection,
+    "delete": delete_collection,
+    "info": collection_info,
+}
+
 def main():
     parser = argparse.ArgumentParser(description="Manage Chroma collections")
-    parser.add_argument("action", choices=["list", "create", "delete", "info"])
+    parser.add_argument("action", choices=["list", *NAMED_ACTIONS])
     parser.add_argument("--name", help="Collection name")
     
     args = parser.parse_args()
     
     if args.action == "list":
         list_collections()
-    elif args.action == "create":
-        if not args.name:
-            print("❌ Collection name required for create action")
-            return 1
-        create_collection(args.name)
-    elif args.action == "delete":
-        if not args.name:
-            print("❌ Collection name required for delete action")
-            return 1
-        delete_collection(args.name)
-    elif args.action == "info":
-        if not args.name:
-            print("❌ Collection name required for info action")
-            return 1
-        collection_info(args.name)
+        return 0
+    
+    if not args.name:
+        print(f"❌ Collection name required for {args.action} action")
+        return 1
+    NAMED_ACTIONS[args.action](args.name)
+    return 0
 
 if __name__ == "__main__":
     main()
@@ -274,7 +286,6 @@ EOF
 """Backup Chroma collections"""
 
 import sys
-import os
 import json
 import zipfile
 from datetime import datetime
@@ -311,8 +322,9 @@ def backup_collections(backup_path: str = None):
                 "embeddings": results.get('embeddings', [])
             }
             
-            # Write to JSON file in zip
-            json_data = json.dumps(backup_data, indent=2)
+            # Write to JSON file in zip (compact: indenting puts every
+            # embedding value on its own line and bloats large backups)
+            json_data = json.dumps(backup_data, separators=(",", ":"))
             zipf.writestr(f"{collection.name}.json", json_data)
     
     print(f"✅ Backup completed: {backup_path}")
@@ -339,7 +351,7 @@ function generate_chroma_examples() {
 import sys
 sys.path.append('..')
 
-from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME
+from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME, HNSW_METADATA
 
 def main():
     """Demonstrate basic Chroma operations"""
@@ -349,7 +361,7 @@ def main():
     # Create or get collection
     collection = client.get_or_create_collection(
         name=DEFAULT_COLLECTION_NAME,
-        metadata={"description": "Sample document collection"}
+        metadata={**HNSW_METADATA, "description": "Sample document collection"}
     )
     
     # Add some sample documents
@@ -411,7 +423,7 @@ from typing import List, Optional, Dict, Any
 import sys
 sys.path.append('..')
 
-from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME
+from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME, HNSW_METADATA
 
 app = FastAPI(title="Vector Search API")
 
@@ -425,6 +437,7 @@ class DocumentQuery(BaseModel):
     query: str
     n_results: int = 10
     filter_metadata: Optional[Dict[str, Any]] = None
+    max_distance: Optional[float] = None  # Drop weaker matches beyond this distance
 
 class SearchResult(BaseModel):
     id: str
@@ -442,11 +455,13 @@ async def startup_event():
     client = get_chroma_client()
     collection = client.get_or_create_collection(
         name=DEFAULT_COLLECTION_NAME,
-        metadata={"description": "API document collection"}
+        metadata={**HNSW_METADATA, "description": "API document collection"}
     )
 
+# Chroma calls block, so endpoints are plain functions that FastAPI
+# runs in its threadpool instead of on the event loop
 @app.post("/documents/add")
-async def add_document(doc: DocumentAdd):
+def add_document(doc: DocumentAdd):
     """Add a document to the vector database"""
     try:
         collection.add(
@@ -459,7 +474,7 @@ async def add_document(doc: DocumentAdd):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/documents/search", response_model=List[SearchResult])
-async def search_documents(query: DocumentQuery):
+def search_documents(query: DocumentQuery):
     """Search for similar documents"""
     try:
         results = collection.query(
@@ -475,6 +490,9 @@ async def search_documents(query: DocumentQuery):
             results['metadatas'][0],
             results['distances'][0]
         )):
+            # Results are ordered by distance, so stop at the first weak match
+            if query.max_distance is not None and distance > query.max_distance:
+                break
             search_results.append(SearchResult(
                 id=results['ids'][0][i],
                 content=doc,
@@ -487,7 +505,7 @@ async def search_documents(query: DocumentQuery):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/collections/info")
-async def collection_info():
+def collection_info():
     """Get collection information"""
     return {
         "name": collection.name,
@@ -496,7 +514,7 @@ async def collection_info():
     }
 
 @app.delete("/documents/{doc_id}")
-async def delete_document(doc_id: str):
+def delete_document(doc_id: str):
     """Delete a document by ID"""
     try:
         collection.delete(ids=[doc_id])
@@ -515,11 +533,13 @@ EOF
 
 import sys
 import os
+import re
+import hashlib
 from typing import List, Dict, Any
 from pathlib import Path
 sys.path.append('..')
 
-from chroma_config import get_chroma_client
+from chroma_config import get_chroma_client, HNSW_METADATA, CHROMA_MAX_BATCH_SIZE
 
 class DocumentProcessor:
     """Process and store documents in Chroma"""
@@ -528,11 +548,15 @@ class DocumentProcessor:
         self.client = get_chroma_client()
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"description": "Processed document collection"}
+            metadata={**HNSW_METADATA, "description": "Processed document collection"}
         )
     
     def add_text_file(self, file_path: str, chunk_size: int = 1000) -> List[str]:
-        """Add a text file to the collection, splitting into chunks"""
+        """Add a text file to the collection, splitting into chunks
+        
+        Returns the IDs of newly added chunks; chunks already stored from an
+        earlier run are kept as-is and not included.
+        """
         path = Path(file_path)
         if not path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
@@ -543,8 +567,12 @@ class DocumentProcessor:
         # Split into chunks
         chunks = self._split_text(content, chunk_size)
         
-        # Generate IDs and metadata
-        ids = [f"{path.stem}_chunk_{i}" for i in range(len(chunks))]
+        # Generate IDs from file path and chunk content so unchanged chunks keep
+        # their ID across runs without colliding with chunks of other files
+        ids = []
+        for chunk in chunks:
+            digest = hashlib.sha256(f"{path}\n{chunk}".encode('utf-8')).hexdigest()[:16]
+            ids.append(f"{path.stem}_{digest}")
         metadatas = [
             {
                 "source": str(path),
@@ -555,17 +583,79 @@ class DocumentProcessor:
             for i in range(len(chunks))
         ]
         
-        # Add to collection
-        self.collection.add(
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Repeated chunks share an ID and are stored once, at their first position
+        first_index = {}
+        for i, chunk_id in enumerate(ids):
+            first_index.setdefault(chunk_id, i)
+        unique_ids = list(first_index)
+        
+        # Only embed chunks that are not already stored in the collection
+        stored = set()
+        if unique_ids:
+            stored = set(self.collection.get(ids=unique_ids, include=[])['ids'])
+        new = [first_index[chunk_id] for chunk_id in unique_ids if chunk_id not in stored]
+        existing = [first_index[chunk_id] for chunk_id in unique_ids if chunk_id in stored]
+        
+        # Refresh positional metadata of stored chunks (update does not re-embed)
+        for start in range(0, len(existing), CHROMA_MAX_BATCH_SIZE):
+            batch = existing[start:start + CHROMA_MAX_BATCH_SIZE]
+            self.collection.update(
+                ids=[ids[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch]
+            )
+        
+        # Add to collection in batches so large files embed in bounded requests
+        for start in range(0, len(new), CHROMA_MAX_BATCH_SIZE):
+            batch = new[start:start + CHROMA_MAX_BATCH_SIZE]
+            self.collection.add(
+                documents=[chunks[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch],
+                ids=[ids[i] for i in batch]
+            )
         
-        return ids
+        # Remove chunks left over from an earlier version of this file, only
+        # once the new chunks are stored so a failed add keeps the old version
+        current_ids = set(unique_ids)
+        previous_ids = self.collection.get(where={"source": str(path)}, include=[])['ids']
+        stale_ids = [chunk_id for chunk_id in previous_ids if chunk_id not in current_ids]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+        
+        return [ids[i] for i in new]
+    
+    def remove_file(self, file_path: str) -> None:
+        """Remove all chunks of a file, e.g. after it was deleted"""
+        self.collection.delete(where={"source": str(Path(file_path))})
     
     def _split_text(self, text: str, chunk_size: int) -> List[str]:
-        """Split text into chunks"""
+        """Split text into chunks, keeping paragraphs together where possible"""
+        chunks = []
+        current = ""
+        
+        for paragraph in re.split(r'\n\s*\n', text):
+            paragraph = ' '.join(paragraph.split())
+            if not paragraph:
+                continue
+            
+            if len(paragraph) > chunk_size:
+                # Paragraph too long for one chunk: fall back to splitting on words
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.extend(self._split_words(paragraph, chunk_size))
+            elif current and len(current) + len(paragraph) + 2 > chunk_size:
+                chunks.append(current)
+                current = paragraph
+            else:
+                current = f"{current}\n\n{paragraph}" if current else paragraph
+        
+        if current:
+            chunks.append(current)
+        
+        return chunks
+    
+    def _split_words(self, text: str, chunk_size: int) -> List[str]:
+        """Split text into chunks on word boundaries"""
         chunks = []
         words = text.split()
         
@@ -586,8 +676,8 @@ class DocumentProcessor:
         
         return chunks
     
-    def search_documents(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search for relevant document chunks"""
+    def search_documents(self, query: str, n_results: int = 5, max_distance: float = None) -> List[Dict[str, Any]]:
+        """Search for relevant document chunks, optionally dropping matches beyond max_distance"""
         results = self.collection.query(
             query_texts=[query],
             n_results=n_results,
@@ -596,6 +686,9 @@ class DocumentProcessor:
         
         search_results = []
         for i in range(len(results['documents'][0])):
+            # Results are ordered by distance, so stop at the first weak match
+            if max_distance is not None and results['distances'][0][i] > max_distance:
+                break
             search_results.append({
                 'content': results['documents'][0][i],
                 'metadata': results['metadatas'][0][i],
@@ -613,8 +706,8 @@ def main():
     readme_path = "../../README.md"
     if os.path.exists(readme_path):
         print(f"Processing {readme_path}...")
-        ids = processor.add_text_file(readme_path, chunk_size=500)
-        print(f"Added {len(ids)} chunks to collection")
+        new_ids = processor.add_text_file(readme_path, chunk_size=500)
+        print(f"Added {len(new_ids)} new chunks to collection")
         
         # Search example
         query = "How to install and use this tool?"
@@ -655,6 +748,12 @@ CHROMA_SERVER_GRPC_PORT=50051
 DEFAULT_COLLECTION_NAME=${PROJECT_NAME:-app}_documents
 CHROMA_MAX_BATCH_SIZE=1000
 
+# HNSW index settings (applied when a collection is created)
+CHROMA_HNSW_SPACE=cosine
+CHROMA_HNSW_M=16
+CHROMA_HNSW_CONSTRUCTION_EF=100
+CHROMA_HNSW_SEARCH_EF=100
+
 # Embedding settings
 EMBEDDING_MODEL=sentence-transformers/all-MiniLM-L6-v2
 EMBEDDING_DEVICE=cpu
@@ -686,14 +785,19 @@ EOF
 # Vector database service for FastAPI integration
 # Generated by Spinbox on $(date)
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any
+import asyncio
 import logging
-from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME
+from chroma_config import get_chroma_client, DEFAULT_COLLECTION_NAME, HNSW_METADATA, CHROMA_MAX_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
 class VectorService:
-    """Service class for vector database operations"""
+    """Service class for vector database operations
+    
+    Chroma calls are blocking, so async methods run them in a worker thread
+    to keep the event loop free for concurrent requests.
+    """
     
     def __init__(self, collection_name: str = None):
         self.client = get_chroma_client()
@@ -706,7 +810,7 @@ class VectorService:
         try:
             self.collection = self.client.get_or_create_collection(
                 name=self.collection_name,
-                metadata={"description": f"Collection for {self.collection_name}"}
+                metadata={**HNSW_METADATA, "description": f"Collection for {self.collection_name}"}
             )
             logger.info(f"Initialized collection: {self.collection_name}")
         except Exception as e:
@@ -716,7 +820,8 @@ class VectorService:
     async def add_document(self, doc_id: str, content: str, metadata: Dict[str, Any] = None) -> bool:
         """Add a single document"""
         try:
-            self.collection.add(
+            await asyncio.to_thread(
+                self.collection.add,
                 documents=[content],
                 metadatas=[metadata or {}],
                 ids=[doc_id]
@@ -727,50 +832,79 @@ class VectorService:
             return False
     
     async def add_documents(self, documents: List[Dict[str, Any]]) -> int:
-        """Add multiple documents"""
+        """Add multiple documents, returning how many were stored"""
+        added = 0
         try:
             doc_contents = [doc['content'] for doc in documents]
             doc_ids = [doc['id'] for doc in documents]
             doc_metadatas = [doc.get('metadata', {}) for doc in documents]
             
-            self.collection.add(
-                documents=doc_contents,
-                metadatas=doc_metadatas,
-                ids=doc_ids
-            )
-            return len(documents)
+            for start in range(0, len(documents), CHROMA_MAX_BATCH_SIZE):
+                end = start + CHROMA_MAX_BATCH_SIZE
+                await asyncio.to_thread(
+                    self.collection.add,
+                    documents=doc_contents[start:end],
+                    metadatas=doc_metadatas[start:end],
+                    ids=doc_ids[start:end]
+                )
+                added += len(doc_ids[start:end])
+            return added
         except Exception as e:
-            logger.error(f"Failed to add documents: {e}")
-            return 0
+            # Earlier batches stay committed, so report what was actually stored
+            logger.error(f"Failed to add documents after {added} of {len(documents)}: {e}")
+            return added
     
-    async def search(self, query: str, n_results: int = 10, filter_metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    async def search(self, query: str, n_results: int = 10, filter_metadata: Dict[str, Any] = None, max_distance: float = None) -> List[Dict[str, Any]]:
+        """Search for similar documents, optionally dropping matches beyond max_distance"""
         try:
-            results = self.collection.query(
+            results = await asyncio.to_thread(
+                self.collection.query,
                 query_texts=[query],
                 n_results=n_results,
                 where=filter_metadata,
                 include=['documents', 'metadatas', 'distances']
             )
-            
-            search_results = []
-            for i in range(len(results['documents'][0])):
-                search_results.append({
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i]
-                })
-            
-            return search_results
+            return self._format_results(results, 0, max_distance)
         except Exception as e:
             logger.error(f"Search failed: {e}")
             return []
     
+    async def search_many(self, queries: List[str], n_results: int = 10, filter_metadata: Dict[str, Any] = None, max_distance: float = None) -> List[List[Dict[str, Any]]]:
+        """Search for several queries in one call, embedding them as a single batch"""
+        if not queries:
+            return []
+        try:
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_texts=queries,
+                n_results=n_results,
+                where=filter_metadata,
+                include=['documents', 'metadatas', 'distances']
+            )
+            return [self._format_results(results, q, max_distance) for q in range(len(queries))]
+        except Exception as e:
+            logger.error(f"Batch search failed: {e}")
+            return [[] for _ in queries]
+    
+    def _format_results(self, results: Dict[str, Any], q: int, max_distance: float = None) -> List[Dict[str, Any]]:
+        """Convert the Chroma results for query number q into result dicts"""
+        search_results = []
+        for i in range(len(results['documents'][q])):
+            # Results are ordered by distance, so stop at the first weak match
+            if max_distance is not None and results['distances'][q][i] > max_distance:
+                break
+            search_results.append({
+                'id': results['ids'][q][i],
+                'content': results['documents'][q][i],
+                'metadata': results['metadatas'][q][i],
+                'distance': results['distances'][q][i]
+            })
+        return search_results
+    
     async def delete_document(self, doc_id: str) -> bool:
         """Delete a document by ID"""
         try:
-            self.collection.delete(ids=[doc_id])
+            await asyncio.to_thread(self.collection.delete, ids=[doc_id])
             return True
         except Exception as e:
             logger.error(f"Failed to delete document {doc_id}: {e}")
@@ -781,7 +915,7 @@ class VectorService:
         try:
             return {
                 "name": self.collection.name,
-                "count": self.collection.count(),
+                "count": await asyncio.to_thread(self.collection.count),
                 "metadata": self.collection.metadata
             }
         except Exception as e:
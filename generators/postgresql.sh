@@ -97,9 +97,11 @@ CREATE INDEX IF NOT EXISTS idx_items_owner_id ON items(owner_id);
 CREATE INDEX IF NOT EXISTS idx_items_created_at ON items(created_at);
 
 -- Vector similarity index (for embeddings)
+-- HNSW needs no training data, so it stays accurate when built on the
+-- empty table at init time (requires pgvector 0.5.0+)
 CREATE INDEX IF NOT EXISTS idx_embeddings_cosine 
-ON embeddings USING ivfflat (embedding vector_cosine_ops) 
-WITH (lists = 100);
+ON embeddings USING hnsw (embedding vector_cosine_ops) 
+WITH (m = 16, ef_construction = 64);
 
 -- Update timestamp trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()